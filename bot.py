@@ -11,8 +11,15 @@ Key features:
 Env vars:
 - TELEGRAM_BOT_TOKEN (required)
 - BOT_OWNER_ID (optional, for /staff /groups debug)
+- BOT_OWNERS (optional, extra comma-separated owner ids for /staff /groups)
 - F1_BOT_DATA (optional, path to runtime data file for small state; default bot_data.json)
-- F1_SHEETS_ID, F1_SHEETS_TAB, F1_GOOGLE_SA_JSON (optional, for Google Sheets logger)
+- F1_SHEETS_ID, F1_SHEETS_TAB, F1_GOOGLE_SA_JSON or F1_GOOGLE_SA_FILE (optional, for Google Sheets logger;
+  Sheets logging and its journal are off unless a sheet id and credentials are set)
+- F1_SHEETS_PENDING (optional, journal of rows not yet written to Sheets; default sheets_pending.jsonl)
+- F1_CONCURRENT_UPDATES (optional, max updates processed at once; default 32)
+- F1_POLL_TIMEOUT (optional, long polling timeout in seconds; default 30)
+- WEBHOOK_URL (optional, public base URL; when set the bot runs in webhook mode instead of polling)
+- PORT, WEBHOOK_SECRET (optional, webhook listen port (default 8443) and secret token)
 
 Files (in repo root):
 - categories.json
@@ -28,20 +35,34 @@ from __future__ import annotations
 import logging
 logging.getLogger("httpx").setLevel(logging.WARNING)
 
+import asyncio
+import functools
+import html
 import json
 import os
 import logging
+from collections import deque
+from contextvars import ContextVar
 from dataclasses import dataclass
-from datetime import datetime, time
-from typing import Any, Dict, List, Optional, Tuple
+from datetime import datetime, timezone, tzinfo
+from enum import IntEnum
+from time import monotonic
+from typing import Any, Awaitable, Callable, Deque, Dict, List, NamedTuple, Optional, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
 
+import httpx
 from telegram import (
+    CallbackQuery,
+    Message,
     Update,
+    User,
     InlineKeyboardButton,
     InlineKeyboardMarkup,
 )
-from telegram.constants import ParseMode
+from telegram.constants import MessageLimit, ParseMode
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter
 from telegram.ext import (
+    AIORateLimiter,
     Application,
     CallbackQueryHandler,
     CommandHandler,
@@ -63,6 +84,10 @@ logger = logging.getLogger("f1-bot")
 
 BOT_TOKEN = os.environ.get("TELEGRAM_BOT_TOKEN", "")
 OWNER_ID = int(os.environ.get("BOT_OWNER_ID", "0") or "0")
+# BOT_OWNERS: optional comma-separated list of extra owner ids
+OWNER_IDS = frozenset(
+    int(x) for x in [str(OWNER_ID), *os.environ.get("BOT_OWNERS", "").split(",")] if x.strip() not in ("", "0")
+)
 
 DATA_FILE = os.environ.get("F1_BOT_DATA", "bot_data.json")
 
@@ -72,10 +97,20 @@ INFO_TEXTS_FILE = os.environ.get("F1_INFO_TEXTS_FILE", "info_texts.json")
 STAFF_FILE = os.environ.get("F1_STAFF_FILE", "staff.json")
 GROUPS_FILE = os.environ.get("F1_GROUPS_FILE", "groups.json")
 
+SEND_RATE = 28
+SEND_MAX_RETRIES = 3
+
+CONCURRENT_UPDATES = int(os.environ.get("F1_CONCURRENT_UPDATES", "32") or "32")
+POLL_TIMEOUT = int(os.environ.get("F1_POLL_TIMEOUT", "30") or "30")
+
+WEBHOOK_URL = os.environ.get("WEBHOOK_URL", "")
+WEBHOOK_PORT = int(os.environ.get("PORT", "8443") or "8443")
+WEBHOOK_SECRET = os.environ.get("WEBHOOK_SECRET", "")
+
 
 # -------------------- Models --------------------
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class StaffMember:
     user_id: int
     username: Optional[str] = None
@@ -83,7 +118,7 @@ class StaffMember:
     active: bool = True
 
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class GroupTarget:
     chat_id: int
     name: Optional[str] = None
@@ -92,21 +127,99 @@ class GroupTarget:
 
 # -------------------- Helpers: file loading --------------------
 
+try:
+    import orjson  # type: ignore
+except Exception:
+    orjson = None  # type: ignore
+
+
+def _json_loads(raw: bytes) -> Any:
+    if orjson is not None:
+        return orjson.loads(raw)
+    return json.loads(raw)
+
+
+def _json_dumps(data: Any) -> bytes:
+    # compact: used for runtime state and Sheets journal lines, which nobody edits by hand
+    if orjson is not None:
+        return orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(data, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+
+# path -> ((st_mtime_ns, st_size), parsed JSON)
+_json_cache: Dict[str, Tuple[Tuple[int, int], Any]] = {}
+
+
+# Per-update snapshot: inside a handler wrapped with per_update_snapshot each
+# file is looked up (stat + cache) at most once and stays consistent for the update
+_update_snapshot: ContextVar[Optional[Dict[str, Any]]] = ContextVar("update_snapshot", default=None)
+
+
+def per_update_snapshot(handler):
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        token = _update_snapshot.set({})
+        try:
+            return await handler(update, context)
+        finally:
+            _update_snapshot.reset(token)
+
+    return wrapper
+
+
 def _load_json(path: str, default: Any) -> Any:
+    snapshot = _update_snapshot.get()
+    if snapshot is None:
+        return _load_json_cached(path, default)
+    if path not in snapshot:
+        snapshot[path] = _load_json_cached(path, default)
+    return snapshot[path]
+
+
+def _load_json_cached(path: str, default: Any) -> Any:
+    # Parsed files are cached until their mtime/size changes on disk, so the
+    # returned objects are shared: callers must not mutate them.
     try:
-        with open(path, "r", encoding="utf-8") as f:
-            return json.load(f)
+        st = os.stat(path)
+        stamp = (st.st_mtime_ns, st.st_size)
+        cached = _json_cache.get(path)
+        if cached is not None and cached[0] == stamp:
+            return cached[1]
+        with open(path, "rb") as f:
+            data = _json_loads(f.read())
     except FileNotFoundError:
+        _json_cache.pop(path, None)
         logger.warning("JSON not found: %s", path)
         return default
     except Exception as e:
         logger.exception("Failed to load JSON %s: %s", path, e)
         return default
 
+    _json_cache[path] = (stamp, data)
+    return data
+
+
+# name -> (source object, value built from it)
+_derived_cache: Dict[str, Tuple[Any, Any]] = {}
+
+
+def _derived(name: str, source: Any, build: Callable[[Any], Any]) -> Any:
+    # Memoizes build(source) while _load_json keeps returning the same cached
+    # object, i.e. until the underlying file changes
+    cached = _derived_cache.get(name)
+    if cached is not None and cached[0] is source:
+        return cached[1]
+    value = build(source)
+    _derived_cache[name] = (source, value)
+    return value
+
 
 def load_categories() -> List[Dict[str, str]]:
     # expected: [{"key":"psy","label":"..."}]
-    cats = _load_json(CATEGORIES_FILE, [])
+    return _derived("categories", _load_json(CATEGORIES_FILE, []), _parse_categories)
+
+
+def _parse_categories(cats: Any) -> List[Dict[str, str]]:
     if isinstance(cats, list):
         return [c for c in cats if isinstance(c, dict) and c.get("key") and c.get("label")]
     return []
@@ -124,7 +237,11 @@ def load_info_texts() -> Dict[str, str]:
 
 
 def load_staff() -> List[StaffMember]:
-    data = _load_json(STAFF_FILE, {})
+    # Built once per staff.json version; the list is shared, don't mutate it
+    return _derived("staff", _load_json(STAFF_FILE, {}), _parse_staff)
+
+
+def _parse_staff(data: Any) -> List[StaffMember]:
     out: List[StaffMember] = []
     if isinstance(data, dict):
         for k, v in data.items():
@@ -144,8 +261,22 @@ def load_staff() -> List[StaffMember]:
     return [m for m in out if m.active]
 
 
+def active_staff_ids() -> Tuple[int, ...]:
+    # Fan-out only needs ids; derived once per staff.json version
+    return _derived("staff_ids", load_staff(), lambda members: tuple(m.user_id for m in members))
+
+
+def active_group_ids() -> Tuple[int, ...]:
+    # Fan-out only needs ids; derived once per groups.json version
+    return _derived("group_ids", load_groups(), lambda gs: tuple(g.chat_id for g in gs))
+
+
 def load_groups() -> List[GroupTarget]:
-    data = _load_json(GROUPS_FILE, {})
+    # Built once per groups.json version; the list is shared, don't mutate it
+    return _derived("groups", _load_json(GROUPS_FILE, {}), _parse_groups)
+
+
+def _parse_groups(data: Any) -> List[GroupTarget]:
     out: List[GroupTarget] = []
     if isinstance(data, dict):
         for k, v in data.items():
@@ -170,57 +301,180 @@ def load_runtime_data() -> Dict[str, Any]:
     return _load_json(DATA_FILE, {"counters": {"ticket": 0}})
 
 
-def save_runtime_data(data: Dict[str, Any]) -> None:
+def _write_runtime_data(data: Dict[str, Any]) -> None:
+    # Serialize up front, write once to a temp file and swap it in, so a crash
+    # mid-write never leaves a truncated bot_data.json behind
+    tmp = DATA_FILE + ".tmp"
     try:
-        with open(DATA_FILE, "w", encoding="utf-8") as f:
-            json.dump(data, f, ensure_ascii=False, indent=2)
+        payload = _json_dumps(data)
+        with open(tmp, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, DATA_FILE)
     except Exception as e:
         logger.exception("Failed to save runtime data: %s", e)
 
 
-def next_ticket_id() -> str:
+async def save_runtime_data(data: Dict[str, Any]) -> None:
+    # Disk write runs in a worker thread so it doesn't stall the event loop
+    await asyncio.to_thread(_write_runtime_data, data)
+
+
+# Runtime data is read once and then kept in memory. Every mutation marks it
+# dirty and starts a write right away; changes made while a write is in flight
+# are coalesced into the next one. The id is handed out before its write
+# lands, so an unclean exit can still reissue the ids of that one in-flight write.
+_runtime_data: Optional[Dict[str, Any]] = None
+_runtime_dirty = False
+_runtime_flush_task: Optional[asyncio.Task] = None
+_runtime_write_lock = asyncio.Lock()
+
+
+def runtime_data() -> Dict[str, Any]:
+    global _runtime_data
+    if _runtime_data is None:
+        loaded = load_runtime_data()
+        # own copy: load_runtime_data() returns the shared cached object
+        data = dict(loaded) if isinstance(loaded, dict) else {}
+        data["counters"] = dict(data.get("counters") or {})
+        _runtime_data = data
+    return _runtime_data
+
+
+async def flush_runtime_data() -> None:
+    global _runtime_dirty
+    async with _runtime_write_lock:
+        if not _runtime_dirty or _runtime_data is None:
+            return
+        _runtime_dirty = False
+        snapshot = {**_runtime_data, "counters": dict(_runtime_data["counters"])}
+        await save_runtime_data(snapshot)
+
+
+async def _flush_runtime_soon() -> None:
+    while _runtime_dirty:
+        await flush_runtime_data()
+
+
+def mark_runtime_dirty() -> None:
+    global _runtime_dirty, _runtime_flush_task
+    _runtime_dirty = True
+    if _runtime_flush_task is None or _runtime_flush_task.done():
+        _runtime_flush_task = asyncio.get_running_loop().create_task(_flush_runtime_soon())
+
+
+def next_ticket_id(now: datetime) -> str:
     # Example: F1-2025-0001 (local counter)
-    data = load_runtime_data()
-    counters = data.setdefault("counters", {})
+    counters = runtime_data()["counters"]
     counters["ticket"] = int(counters.get("ticket", 0)) + 1
-    save_runtime_data(data)
-    year = datetime.utcnow().year
+    mark_runtime_dirty()
+    year = now.year
     return f"F1-{year}-{counters['ticket']:04d}"
 
 
 # -------------------- Helpers: time / messages --------------------
 
-def _parse_hhmm(value: str) -> Optional[time]:
+_DOW = ("mon", "tue", "wed", "thu", "fri", "sat", "sun")
+
+
+class WorkingHours(NamedTuple):
+    tz: Optional[tzinfo]
+    # per weekday (Monday = 0): (start, end) minute-of-day pairs, end inclusive
+    days: Tuple[Tuple[Tuple[int, int], ...], ...]
+
+
+def _parse_hhmm(value: Any) -> Optional[int]:
+    # "09:30" -> 570 (minutes since midnight)
     try:
-        hh, mm = value.split(":")
-        return time(int(hh), int(mm))
+        hh, mm = str(value).split(":")
+        h, m = int(hh), int(mm)
     except Exception:
         return None
+    if not (0 <= h < 24 and 0 <= m < 60):
+        return None
+    return h * 60 + m
 
 
-def is_working_time(cfg: Dict[str, Any], now: Optional[datetime] = None) -> bool:
-    # cfg["working_hours"] expected: {"days":[0..6], "start":"09:00", "end":"18:00"}
-    now = now or datetime.now()
+def _minute_ranges(start_s: Any, end_s: Any) -> List[Tuple[int, int]]:
+    start, end = _parse_hhmm(start_s), _parse_hhmm(end_s)
+    if start is None or end is None:
+        return []
+    if start <= end:
+        return [(start, end)]
+    # overnight window in the legacy schedule: both ends on the same weekday
+    return [(start, 24 * 60 - 1), (0, end)]
+
+
+def _config_tz(cfg: Dict[str, Any]) -> Optional[tzinfo]:
+    name = cfg.get("timezone")
+    if not name:
+        return None
+    try:
+        return ZoneInfo(str(name))
+    except (ZoneInfoNotFoundError, ValueError):
+        logger.warning("Unknown timezone %r in bot_config.json; using server local time", name)
+        return None
+
+
+def _compile_working_hours(cfg: Dict[str, Any]) -> Optional[WorkingHours]:
+    # cfg["working_hours"] expected either per weekday (an overnight pair runs
+    # into the next weekday):
+    #   {"mon": [["09:00", "18:00"], ...], ..., "sun": []}
+    # or the legacy form: {"days": [0..6], "start": "09:00", "end": "18:00"}
+    # None means "no usable schedule" (always working)
     wh = cfg.get("working_hours") or {}
     if not isinstance(wh, dict):
-        return True
-    days = wh.get("days")
-    start_s = wh.get("start")
-    end_s = wh.get("end")
-    if not isinstance(days, list) or not start_s or not end_s:
-        return True
+        return None
 
-    if now.weekday() not in days:
-        return False
-    start_t = _parse_hhmm(start_s)
-    end_t = _parse_hhmm(end_s)
-    if not start_t or not end_t:
+    days: List[List[Tuple[int, int]]] = [[] for _ in _DOW]
+    if "days" in wh:
+        listed = wh.get("days")
+        if not isinstance(listed, list) or not wh.get("start") or not wh.get("end"):
+            return None
+        ranges = _minute_ranges(wh["start"], wh["end"])
+        if not ranges:
+            # days without usable hours: whole listed days count as working
+            ranges = [(0, 24 * 60 - 1)]
+        for d in listed:
+            if isinstance(d, int) and 0 <= d < len(days):
+                days[d].extend(ranges)
+    else:
+        if not any(k in wh for k in _DOW):
+            return None
+        for i, key in enumerate(_DOW):
+            for pair in wh.get(key) or ():
+                if not isinstance(pair, (list, tuple)) or len(pair) != 2:
+                    continue
+                start, end = _parse_hhmm(pair[0]), _parse_hhmm(pair[1])
+                if start is None or end is None:
+                    continue
+                if start <= end:
+                    days[i].append((start, end))
+                else:
+                    # overnight shift: the part after midnight is the next weekday
+                    days[i].append((start, 24 * 60 - 1))
+                    days[(i + 1) % len(days)].append((0, end))
+
+    return WorkingHours(_config_tz(cfg), tuple(tuple(d) for d in days))
+
+
+def is_working_time(cfg: Dict[str, Any], now: Optional[datetime] = None) -> bool:
+    # schedule is parsed once per bot_config.json version
+    wh = _derived("working_hours", cfg, _compile_working_hours)
+    if wh is None:
         return True
-    cur = now.time()
-    if start_t <= end_t:
-        return start_t <= cur <= end_t
-    # overnight window
-    return cur >= start_t or cur <= end_t
+
+    # aware datetimes are converted to the configured zone; naive ones are taken as-is
+    if now is None:
+        now = datetime.now(wh.tz)
+    elif now.tzinfo is not None:
+        now = now.astimezone(wh.tz)
+    cur = now.hour * 60 + now.minute
+    for start, end in wh.days[now.weekday()]:
+        if start <= cur <= end:
+            return True
+    return False
 
 
 def get_user_reply_text(cfg: Dict[str, Any], working: bool) -> str:
@@ -234,143 +488,596 @@ def get_user_reply_text(cfg: Dict[str, Any], working: bool) -> str:
 
 # -------------------- Keyboards --------------------
 
-def kb_main_menu() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
+# Static keyboards are immutable, so they are built once and shared
+
+KB_MAIN_MENU = InlineKeyboardMarkup(
+    [
+        [InlineKeyboardButton("🟢 Почати", callback_data="menu:start")],
+        [InlineKeyboardButton("📂 Категорії", callback_data="menu:categories")],
         [
-            [InlineKeyboardButton("🟢 Почати", callback_data="menu:start")],
-            [InlineKeyboardButton("📂 Категорії", callback_data="menu:categories")],
-            [
-                InlineKeyboardButton("ℹ️ Про бота", callback_data="menu:about_bot"),
-                InlineKeyboardButton("🏢 Про ГО «Ф1»", callback_data="menu:about_ngo"),
-            ],
-        ]
-    )
+            InlineKeyboardButton("ℹ️ Про бота", callback_data="menu:about_bot"),
+            InlineKeyboardButton("🏢 Про ГО «Ф1»", callback_data="menu:about_ngo"),
+        ],
+    ]
+)
+
+KB_BACK_TO_MENU = InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Меню", callback_data="menu:home")]])
+
+KB_ANON = InlineKeyboardMarkup(
+    [
+        [
+            InlineKeyboardButton("✅ Так, анонімно", callback_data="anon:yes"),
+            InlineKeyboardButton("❌ Ні, не анонімно", callback_data="anon:no"),
+        ],
+        [InlineKeyboardButton("⬅️ Назад", callback_data="menu:home")],
+    ]
+)
 
+KB_NGO_MENU = InlineKeyboardMarkup(
+    [
+        [InlineKeyboardButton("🎯 Місія", callback_data="ngo:mission")],
+        [InlineKeyboardButton("🧩 Напрями діяльності", callback_data="ngo:directions")],
+        [InlineKeyboardButton("📞 Контакти", callback_data="ngo:contacts")],
+        [InlineKeyboardButton("⬅️ Назад", callback_data="menu:home")],
+    ]
+)
 
-def kb_back_to_menu() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup([[InlineKeyboardButton("🏠 Меню", callback_data="menu:home")]])
+KB_CATEGORY_CHOSEN = InlineKeyboardMarkup(
+    [
+        [InlineKeyboardButton("📂 Змінити категорію", callback_data="menu:categories")],
+        [InlineKeyboardButton("🏠 Меню", callback_data="menu:home")],
+    ]
+)
 
 
-def kb_anon() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        [
-            [
-                InlineKeyboardButton("✅ Так, анонімно", callback_data="anon:yes"),
-                InlineKeyboardButton("❌ Ні, не анонімно", callback_data="anon:no"),
-            ],
-            [InlineKeyboardButton("⬅️ Назад", callback_data="menu:home")],
-        ]
-    )
+# Rows shared by both kb_categories variants
+_KB_INFO_ROWS = (
+    (InlineKeyboardButton("ℹ️ Інформація про бота", callback_data="menu:about_bot"),),
+    (InlineKeyboardButton("🏢 Інформація про ГО «Ф1»", callback_data="menu:about_ngo"),),
+)
+_KB_BACK_ROW = ((InlineKeyboardButton("⬅️ Назад", callback_data="menu:home"),),)
 
 
-def kb_ngo_menu() -> InlineKeyboardMarkup:
-    return InlineKeyboardMarkup(
-        [
-            [InlineKeyboardButton("🎯 Місія", callback_data="ngo:mission")],
-            [InlineKeyboardButton("🧩 Напрями діяльності", callback_data="ngo:directions")],
-            [InlineKeyboardButton("📞 Контакти", callback_data="ngo:contacts")],
-            [InlineKeyboardButton("⬅️ Назад", callback_data="menu:home")],
-        ]
+def _category_rows() -> Tuple[Tuple[InlineKeyboardButton, ...], ...]:
+    # One button row per category, built once per categories.json version
+    return _derived(
+        "category_rows",
+        load_categories(),
+        lambda cats: tuple((InlineKeyboardButton(c["label"], callback_data=f"cat:{c['key']}"),) for c in cats),
     )
 
 
 def kb_categories(include_info_buttons: bool = True) -> InlineKeyboardMarkup:
-    cats = load_categories()
-    rows: List[List[InlineKeyboardButton]] = []
-    for c in cats:
-        rows.append([InlineKeyboardButton(c["label"], callback_data=f"cat:{c['key']}")])
+    # Rebuilt only when the category rows change; both variants share the row objects
+    extra_rows = _KB_INFO_ROWS if include_info_buttons else ()
+    return _derived(
+        f"kb_categories:{include_info_buttons}",
+        _category_rows(),
+        lambda rows: InlineKeyboardMarkup(rows + extra_rows + _KB_BACK_ROW),
+    )
 
-    if include_info_buttons:
-        rows.append([InlineKeyboardButton("ℹ️ Інформація про бота", callback_data="menu:about_bot")])
-        rows.append([InlineKeyboardButton("🏢 Інформація про ГО «Ф1»", callback_data="menu:about_ngo")])
 
-    rows.append([InlineKeyboardButton("⬅️ Назад", callback_data="menu:home")])
-    return InlineKeyboardMarkup(rows)
+def _categories_by_key() -> Dict[str, str]:
+    return _derived(
+        "categories_by_key",
+        load_categories(),
+        # reversed: on duplicate keys the first entry wins
+        lambda cats: {c["key"]: c["label"] for c in reversed(cats)},
+    )
 
 
 def _cat_label(cat_key: str) -> str:
-    for c in load_categories():
-        if c.get("key") == cat_key:
-            return c.get("label") or cat_key
-    return cat_key
+    return _categories_by_key().get(cat_key, cat_key)
+
+
+def _category_chosen_html(label: str) -> str:
+    return (
+        f"Категорія обрана: <b>{html.escape(label)}</b>\n\n"
+        "Напишіть, будь ласка, ваше повідомлення одним текстом."
+    )
+
+
+def _category_chosen_text(cat_key: str) -> str:
+    # rendered once per categories.json version
+    texts = _derived(
+        "category_chosen_texts",
+        _categories_by_key(),
+        lambda by_key: {k: _category_chosen_html(lbl) for k, lbl in by_key.items()},
+    )
+    return texts.get(cat_key) or _category_chosen_html(cat_key)
 
 
 # -------------------- Sheets logger (optional) --------------------
 
 try:
-    from sheets_logger import append_row  # type: ignore
+    from sheets_logger import append_rows, is_configured, is_transient_error  # type: ignore
 except Exception:
-    append_row = None  # type: ignore
+    append_rows = None  # type: ignore
+    is_configured = None  # type: ignore
+    is_transient_error = None  # type: ignore
+
+# Without a configured sheet nothing is queued or journaled at all
+SHEETS_ENABLED = append_rows is not None and is_configured()
+
+# Rows are queued and written by a background task in batches of up to
+# SHEETS_BATCH_SIZE rows (waiting at most SHEETS_BATCH_WAIT seconds to fill one),
+# so the Sheets API round-trip never sits on the user's request path.
+SHEETS_BATCH_SIZE = 50
+SHEETS_BATCH_WAIT = 2.0
+# batches failing with transient errors (429, 5xx, network) are retried with
+# backoff, doubling up to SHEETS_RETRY_MAX seconds; other errors won't go away
+# by retrying, so those rows are moved to SHEETS_FAILED_FILE instead
+SHEETS_RETRY_MIN = 5.0
+SHEETS_RETRY_MAX = 300.0
+
+# Every queued row is also appended to a local journal (one JSON row per line),
+# so rows survive a crash or a Sheets outage at shutdown and are queued again
+# on the next start. A finished batch appends its row count as a marker line
+# (`50`), so the journal records which of its oldest rows already reached the
+# sheet. Delivery is at-least-once: a crash between a successful append and its
+# marker replays that one batch.
+SHEETS_PENDING_FILE = os.environ.get("F1_SHEETS_PENDING", "sheets_pending.jsonl")
+SHEETS_FAILED_FILE = SHEETS_PENDING_FILE + ".failed"
+
+_sheets_queue: asyncio.Queue = asyncio.Queue()
+_sheets_task: Optional[asyncio.Task] = None
+# batch taken from the queue by the worker, and its write if one is running
+_sheets_batch: List[List[Any]] = []
+_sheets_write: Optional[asyncio.Task] = None
+
+# Journal lines of all unwritten rows, oldest first (in-flight batch, then
+# queue). The file may still start with _sheets_pending_done already written
+# (and marked) lines; it is rewritten once those outnumber the unwritten ones.
+_sheets_pending: Deque[bytes] = deque()
+_sheets_pending_done = 0
+_sheets_pending_fd: Optional[int] = None
+
+
+def _chmod_private(fd: int) -> None:
+    try:
+        os.fchmod(fd, 0o600)
+    except (AttributeError, OSError):
+        # no fchmod on Windows
+        pass
+
+
+def _open_private(path: str, flags: int):
+    # Journal files hold users' message text: owner-only, whatever the umask.
+    # fchmod also tightens files created by older versions with default modes.
+    fd = os.open(path, os.O_WRONLY | os.O_CREAT | flags, 0o600)
+    _chmod_private(fd)
+    return os.fdopen(fd, "wb")
+
+
+def _open_pending_fd() -> None:
+    global _sheets_pending_fd
+    try:
+        _sheets_pending_fd = os.open(SHEETS_PENDING_FILE, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o600)
+        _chmod_private(_sheets_pending_fd)
+    except OSError as e:
+        _sheets_pending_fd = None
+        logger.warning("Sheets rows won't survive restarts, can't open %s: %s", SHEETS_PENDING_FILE, e)
+
+
+def _rewrite_sheets_pending() -> None:
+    # Replaces the journal with just the unwritten lines. Synchronous on
+    # purpose: no row can be appended between the snapshot and the fd swap.
+    global _sheets_pending_done
+    tmp = SHEETS_PENDING_FILE + ".tmp"
+    try:
+        with _open_private(tmp, os.O_TRUNC) as f:
+            f.write(b"".join(_sheets_pending))
+        os.replace(tmp, SHEETS_PENDING_FILE)
+    except OSError as e:
+        logger.warning("Failed to compact %s: %s", SHEETS_PENDING_FILE, e)
+        if _sheets_pending_fd is None:
+            _open_pending_fd()
+        return
+    if _sheets_pending_fd is not None:
+        os.close(_sheets_pending_fd)
+    _open_pending_fd()
+    _sheets_pending_done = 0
+
+
+def _load_sheets_pending() -> List[List[Any]]:
+    # Rows left unwritten in the journal by the previous run, in order
+    rows: List[List[Any]] = []
+    lines: List[bytes] = []
+    written = 0  # leading rows covered by marker lines
+    try:
+        with open(SHEETS_PENDING_FILE, "rb") as f:
+            for line in f:
+                try:
+                    item = _json_loads(line)
+                except Exception:
+                    # torn last line after a crash
+                    logger.warning("Skipping unreadable line in %s", SHEETS_PENDING_FILE)
+                    continue
+                if isinstance(item, int):
+                    written = min(written + item, len(rows))
+                    continue
+                rows.append(item)
+                lines.append(line if line.endswith(b"\n") else line + b"\n")
+    except FileNotFoundError:
+        pass
+    except Exception as e:
+        logger.exception("Failed to read %s: %s", SHEETS_PENDING_FILE, e)
+
+    _sheets_pending.clear()
+    _sheets_pending.extend(lines[written:])
+    # start from a file that matches _sheets_pending line for line
+    _rewrite_sheets_pending()
+    return rows[written:]
+
+
+def _finish_sheets_rows(count: int, failed: bool = False) -> None:
+    # The oldest `count` unwritten rows are done with: written, or (failed)
+    # moved to SHEETS_FAILED_FILE for manual replay
+    global _sheets_pending_done
+    done = [_sheets_pending.popleft() for _ in range(min(count, len(_sheets_pending)))]
+    if failed:
+        try:
+            with _open_private(SHEETS_FAILED_FILE, os.O_APPEND) as f:
+                f.write(b"".join(done))
+        except OSError as e:
+            logger.error("Failed to save %d rows to %s: %s", len(done), SHEETS_FAILED_FILE, e)
+
+    if _sheets_pending_fd is None:
+        return
+    if not _sheets_pending:
+        try:
+            os.ftruncate(_sheets_pending_fd, 0)
+            _sheets_pending_done = 0
+        except OSError as e:
+            logger.warning("Failed to truncate %s: %s", SHEETS_PENDING_FILE, e)
+        return
+    # compact only when most of the file is stale, so draining a backlog
+    # doesn't rewrite the remainder after every batch; until then a marker
+    # records that these rows are done
+    _sheets_pending_done += len(done)
+    if _sheets_pending_done >= len(_sheets_pending):
+        _rewrite_sheets_pending()
+        return
+    try:
+        os.write(_sheets_pending_fd, b"%d\n" % len(done))
+    except OSError as e:
+        logger.warning("Failed to mark written rows in %s: %s", SHEETS_PENDING_FILE, e)
 
 
 def log_to_sheets(row: List[Any]) -> None:
-    if append_row is None:
+    if not SHEETS_ENABLED:
         return
+    line = _json_dumps(row) + b"\n"
+    _sheets_pending.append(line)
+    if _sheets_pending_fd is not None:
+        try:
+            os.write(_sheets_pending_fd, line)
+        except OSError as e:
+            logger.warning("Failed to journal Sheets row: %s", e)
+    _sheets_queue.put_nowait(row)
+
+
+async def _write_sheet_rows(rows: List[List[Any]]) -> bool:
+    # True when the rows are done with (written, or set aside after a
+    # permanent error); False when the write should be retried later
     try:
-        append_row(row)
+        await asyncio.to_thread(append_rows, rows)
     except Exception as e:
-        logger.exception("Sheets logging failed: %s", e)
+        if is_transient_error(e):
+            logger.warning("Sheets logging failed (%d rows), will retry: %s", len(rows), e)
+            return False
+        logger.exception(
+            "Sheets logging failed permanently (%d rows moved to %s): %s", len(rows), SHEETS_FAILED_FILE, e
+        )
+        _finish_sheets_rows(len(rows), failed=True)
+        return True
+    _finish_sheets_rows(len(rows))
+    return True
+
+
+async def _sheets_worker() -> None:
+    global _sheets_batch, _sheets_write
+    loop = asyncio.get_running_loop()
+    while True:
+        _sheets_batch = [await _sheets_queue.get()]
+        deadline = loop.time() + SHEETS_BATCH_WAIT
+        while len(_sheets_batch) < SHEETS_BATCH_SIZE:
+            timeout = deadline - loop.time()
+            if timeout <= 0:
+                break
+            try:
+                _sheets_batch.append(await asyncio.wait_for(_sheets_queue.get(), timeout))
+            except asyncio.TimeoutError:
+                break
+
+        delay = SHEETS_RETRY_MIN
+        while True:
+            # shielded: cancelling the worker can't stop the thread doing the
+            # write, so stop_sheets_worker waits for this task instead
+            _sheets_write = loop.create_task(_write_sheet_rows(_sheets_batch))
+            if await asyncio.shield(_sheets_write):
+                break
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, SHEETS_RETRY_MAX)
+        _sheets_write = None
+        _sheets_batch = []
+
+
+def start_sheets_worker() -> None:
+    global _sheets_task
+    if SHEETS_ENABLED and _sheets_task is None:
+        for row in _load_sheets_pending():
+            _sheets_queue.put_nowait(row)
+        if not _sheets_queue.empty():
+            logger.info("Re-queued %d Sheets rows from %s", _sheets_queue.qsize(), SHEETS_PENDING_FILE)
+        _sheets_task = asyncio.get_running_loop().create_task(_sheets_worker())
+
+
+async def stop_sheets_worker() -> None:
+    global _sheets_task, _sheets_batch, _sheets_write, _sheets_pending_fd
+    if _sheets_task is not None:
+        _sheets_task.cancel()
+        try:
+            await _sheets_task
+        except asyncio.CancelledError:
+            pass
+        _sheets_task = None
+
+    # the worker's batch is only re-sent if its last write didn't finish it
+    finished = False
+    if _sheets_write is not None:
+        finished = await _sheets_write
+        _sheets_write = None
+    rows = [] if finished else _sheets_batch
+    _sheets_batch = []
+
+    # one last attempt for the unwritten rows, oldest first; whatever still
+    # fails stays in the journal for the next start
+    while not _sheets_queue.empty():
+        rows.append(_sheets_queue.get_nowait())
+    if rows:
+        await _write_sheet_rows(rows)
+
+    if _sheets_pending_fd is not None:
+        # leave only the unwritten rows behind
+        if _sheets_pending_done > 0:
+            _rewrite_sheets_pending()
+        os.close(_sheets_pending_fd)
+        _sheets_pending_fd = None
 
 
 # -------------------- State helpers --------------------
 
+class Stage(IntEnum):
+    MENU = 0
+    ANON = 1
+    ANON_THEN_CATEGORIES = 2
+    CATEGORY = 3
+    AWAIT_MESSAGE = 4
+
+
+class Flow(NamedTuple):
+    stage: Stage = Stage.MENU
+    anon: Optional[bool] = None
+    category: Optional[str] = None
+    touched: float = 0.0  # monotonic time of the last change
+
+
+# The whole per-user flow lives in one small tuple under a single user_data key
+_FLOW_KEY = "flow"
+_MENU_FLOW = Flow()
+
+# Users whose flow is back at the menu, or untouched for USER_FLOW_TTL seconds,
+# are dropped from application.user_data every USER_DATA_SWEEP_INTERVAL seconds,
+# so memory tracks recently active users rather than everyone ever seen
+USER_FLOW_TTL = 3600.0
+USER_DATA_SWEEP_INTERVAL = 600.0
+
+_user_data_sweep_task: Optional[asyncio.Task] = None
+
+
+def get_flow(context: ContextTypes.DEFAULT_TYPE) -> Flow:
+    return context.user_data.get(_FLOW_KEY) or _MENU_FLOW
+
+
+def set_flow(context: ContextTypes.DEFAULT_TYPE, **changes: Any) -> None:
+    context.user_data[_FLOW_KEY] = get_flow(context)._replace(touched=monotonic(), **changes)
+
+
 def reset_user_flow(context: ContextTypes.DEFAULT_TYPE) -> None:
-    # Keep only minimal info
-    context.user_data.pop("anon", None)
-    context.user_data.pop("category", None)
-    context.user_data["stage"] = "menu"
+    # menu is the default, so nothing needs to be stored
+    context.user_data.pop(_FLOW_KEY, None)
+
+
+def sweep_user_data(app: Application) -> int:
+    cutoff = monotonic() - USER_FLOW_TTL
+    stale = [
+        user_id
+        for user_id, data in app.user_data.items()
+        if (flow := data.get(_FLOW_KEY)) is None or flow.touched < cutoff
+    ]
+    for user_id in stale:
+        app.drop_user_data(user_id)
+    return len(stale)
+
 
+async def _user_data_sweeper(app: Application) -> None:
+    while True:
+        await asyncio.sleep(USER_DATA_SWEEP_INTERVAL)
+        dropped = sweep_user_data(app)
+        if dropped:
+            logger.debug("Dropped user_data of %d idle users", dropped)
 
-def set_stage(context: ContextTypes.DEFAULT_TYPE, stage: str) -> None:
-    context.user_data["stage"] = stage
 
+def start_user_data_sweeper(app: Application) -> None:
+    global _user_data_sweep_task
+    if _user_data_sweep_task is None:
+        _user_data_sweep_task = asyncio.get_running_loop().create_task(_user_data_sweeper(app))
 
-def get_stage(context: ContextTypes.DEFAULT_TYPE) -> str:
-    return str(context.user_data.get("stage") or "menu")
+
+def stop_user_data_sweeper() -> None:
+    global _user_data_sweep_task
+    if _user_data_sweep_task is not None:
+        _user_data_sweep_task.cancel()
+        _user_data_sweep_task = None
 
 
 # -------------------- Commands --------------------
 
+def owner_only(handler):
+    # Rejects non-owners with a single set lookup before the handler runs.
+    # With no owners configured the commands stay open (debug mode).
+    @functools.wraps(handler)
+    async def wrapper(update: Update, context: ContextTypes.DEFAULT_TYPE):
+        user = update.effective_user
+        if OWNER_IDS and user and user.id not in OWNER_IDS:
+            return await update.message.reply_text("Нема доступу.")
+        return await handler(update, context)
+
+    return wrapper
+
+
+@per_update_snapshot
 async def cmd_start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     reset_user_flow(context)
     info = load_info_texts()
     desc = info.get("bot_description") or "🤖 Бот ГО «Ф1». Натисніть «Почати», щоб залишити звернення."
-    await update.message.reply_text(desc, reply_markup=kb_main_menu())
+    await update.message.reply_text(desc, reply_markup=KB_MAIN_MENU)
 
 
 async def cmd_menu(update: Update, context: ContextTypes.DEFAULT_TYPE):
     reset_user_flow(context)
-    await update.message.reply_text("Оберіть дію:", reply_markup=kb_main_menu())
+    await update.message.reply_text("Оберіть дію:", reply_markup=KB_MAIN_MENU)
+
+
+def _render_staff(members: List[StaffMember]) -> str:
+    lines = []
+    for m in sorted(members, key=lambda x: x.user_id):
+        extra = " ".join(filter(None, (f"@{m.username}" if m.username else None, m.name)))
+        lines.append(f"- <code>{m.user_id}</code> {html.escape(extra)}".strip())
+    return "Співробітники:\n" + "\n".join(lines)
 
 
+def _render_groups(gs: List[GroupTarget]) -> str:
+    lines = []
+    for g in sorted(gs, key=lambda x: x.chat_id):
+        nm = f" ({html.escape(g.name)})" if g.name else ""
+        lines.append(f"- <code>{g.chat_id}</code>{nm}")
+    return "Групи:\n" + "\n".join(lines)
+
+
+@per_update_snapshot
+@owner_only
 async def cmd_staff(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if OWNER_ID and update.effective_user and update.effective_user.id != OWNER_ID:
-        return await update.message.reply_text("Нема доступу.")
     members = load_staff()
     if not members:
         return await update.message.reply_text("Список співробітників порожній.")
-    lines = []
-    for m in sorted(members, key=lambda x: x.user_id):
-        extra = " ".join([f"@{m.username}" if m.username else "", m.name or ""]).strip()
-        lines.append(f"- `{m.user_id}` {extra}".strip())
-    await update.message.reply_text("Співробітники:\n" + "\n".join(lines), parse_mode=ParseMode.MARKDOWN)
+    # rendered text is cached until staff.json changes
+    text = _derived("staff_text", members, _render_staff)
+    await update.message.reply_text(text, parse_mode=ParseMode.HTML)
 
 
+@per_update_snapshot
+@owner_only
 async def cmd_groups(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    if OWNER_ID and update.effective_user and update.effective_user.id != OWNER_ID:
-        return await update.message.reply_text("Нема доступу.")
     gs = load_groups()
     if not gs:
         return await update.message.reply_text("Список груп порожній.")
-    lines = []
-    for g in sorted(gs, key=lambda x: x.chat_id):
-        nm = f" ({g.name})" if g.name else ""
-        lines.append(f"- `{g.chat_id}`{nm}")
-    await update.message.reply_text("Групи:\n" + "\n".join(lines), parse_mode=ParseMode.MARKDOWN)
+    # rendered text is cached until groups.json changes
+    text = _derived("groups_text", gs, _render_groups)
+    await update.message.reply_text(text, parse_mode=ParseMode.HTML)
 
 
 # -------------------- Callback handlers --------------------
 
+async def _cb_home(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, arg: str):
+    reset_user_flow(context)
+    return await q.edit_message_text("Оберіть дію:", reply_markup=KB_MAIN_MENU)
+
+
+async def _cb_start(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, arg: str):
+    set_flow(context, stage=Stage.ANON)
+    return await q.edit_message_text(
+        "Бажаєте залишити звернення анонімно?",
+        reply_markup=KB_ANON,
+    )
+
+
+async def _cb_categories(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, arg: str):
+    # If anonymity already chosen - show categories; otherwise ask anon first then categories
+    if get_flow(context).anon is None:
+        set_flow(context, stage=Stage.ANON_THEN_CATEGORIES)
+        return await q.edit_message_text(
+            "Бажаєте залишити звернення анонімно?",
+            reply_markup=KB_ANON,
+        )
+    set_flow(context, stage=Stage.CATEGORY)
+    return await q.edit_message_text("Оберіть категорію звернення:", reply_markup=kb_categories())
+
+
+async def _cb_about_bot(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, arg: str):
+    text = load_info_texts().get("bot_description") or "🤖 Бот ГО «Ф1»."
+    return await q.edit_message_text(text, reply_markup=KB_BACK_TO_MENU)
+
+
+async def _cb_about_ngo(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, arg: str):
+    # Show NGO submenu
+    return await q.edit_message_text("Інформація про ГО «Ф1». Оберіть розділ:", reply_markup=KB_NGO_MENU)
+
+
+# ngo:<key> -> (info_texts key, fallback text)
+_NGO_SECTIONS: Dict[str, Tuple[str, str]] = {
+    "mission": ("ngo_mission", "Місія ГО «Ф1»."),
+    "directions": ("ngo_directions", "Напрями діяльності ГО «Ф1»."),
+    "contacts": ("ngo_contacts", "Контакти ГО «Ф1»."),
+}
+
+
+async def _cb_ngo(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, arg: str):
+    section = _NGO_SECTIONS.get(arg)
+    if section is None:
+        return await _cb_fallback(q, context, arg)
+    info_key, default = section
+    info = load_info_texts()
+    # Support both split keys and legacy "ngo_info"
+    text = info.get(info_key) or info.get("ngo_info") or default
+    return await q.edit_message_text(text, reply_markup=KB_NGO_MENU)
+
+
+async def _cb_anon(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, arg: str):
+    set_flow(context, stage=Stage.CATEGORY, anon=(arg == "yes"))
+    return await q.edit_message_text("Оберіть категорію звернення:", reply_markup=kb_categories())
+
+
+async def _cb_cat(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, arg: str):
+    set_flow(context, stage=Stage.AWAIT_MESSAGE, category=arg)
+    return await q.edit_message_text(
+        _category_chosen_text(arg),
+        parse_mode=ParseMode.HTML,
+        reply_markup=KB_CATEGORY_CHOSEN,
+    )
+
+
+async def _cb_fallback(q: CallbackQuery, context: ContextTypes.DEFAULT_TYPE, arg: str):
+    return await q.edit_message_text("Оберіть дію:", reply_markup=KB_MAIN_MENU)
+
+
+# Exact callback_data matches first, then "<prefix>:<arg>" handlers
+_CB_ROUTES = {
+    "menu:home": _cb_home,
+    "menu:start": _cb_start,
+    "menu:categories": _cb_categories,
+    "menu:about_bot": _cb_about_bot,
+    "menu:about_ngo": _cb_about_ngo,
+}
+_CB_PREFIX = {
+    "ngo": _cb_ngo,
+    "anon": _cb_anon,
+    "cat": _cb_cat,
+}
+
+
+@per_update_snapshot
 async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     q = update.callback_query
     if not q:
@@ -378,160 +1085,223 @@ async def on_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await q.answer()
 
     data = q.data or ""
-    info = load_info_texts()
-    cfg = load_config()
+    prefix, _, arg = data.partition(":")
+    handler = _CB_ROUTES.get(data) or _CB_PREFIX.get(prefix) or _cb_fallback
+    return await handler(q, context, arg)
 
-    if data in ("menu:home",):
-        reset_user_flow(context)
-        return await q.edit_message_text("Оберіть дію:", reply_markup=kb_main_menu())
 
-    if data == "menu:start":
-        set_stage(context, "anon")
-        return await q.edit_message_text(
-            "Бажаєте залишити звернення анонімно?",
-            reply_markup=kb_anon(),
-        )
+# -------------------- Message routing --------------------
 
-    if data == "menu:categories":
-        # If anonymity already chosen - show categories; otherwise ask anon first then categories
-        if context.user_data.get("anon") is None:
-            set_stage(context, "anon_then_categories")
-            return await q.edit_message_text(
-                "Бажаєте залишити звернення анонімно?",
-                reply_markup=kb_anon(),
-            )
-        set_stage(context, "category")
-        return await q.edit_message_text("Оберіть категорію звернення:", reply_markup=kb_categories())
-
-    if data == "menu:about_bot":
-        text = info.get("bot_description") or "🤖 Бот ГО «Ф1»."
-        return await q.edit_message_text(text, reply_markup=kb_back_to_menu())
-
-    if data == "menu:about_ngo":
-        # Show NGO submenu
-        return await q.edit_message_text("Інформація про ГО «Ф1». Оберіть розділ:", reply_markup=kb_ngo_menu())
-
-    if data.startswith("ngo:"):
-        key = data.split(":", 1)[1]
-        # Support both split keys and legacy "ngo_info"
-        mission = info.get("ngo_mission")
-        directions = info.get("ngo_directions")
-        contacts = info.get("ngo_contacts")
-        legacy = info.get("ngo_info")
-
-        if key == "mission":
-            text = mission or legacy or "Місія ГО «Ф1»."
-            return await q.edit_message_text(text, reply_markup=kb_ngo_menu())
-        if key == "directions":
-            text = directions or legacy or "Напрями діяльності ГО «Ф1»."
-            return await q.edit_message_text(text, reply_markup=kb_ngo_menu())
-        if key == "contacts":
-            text = contacts or legacy or "Контакти ГО «Ф1»."
-            return await q.edit_message_text(text, reply_markup=kb_ngo_menu())
-
-    if data.startswith("anon:"):
-        anon = data.split(":", 1)[1] == "yes"
-        context.user_data["anon"] = anon
-
-        # Continue flow depending on stage
-        stage = get_stage(context)
-        set_stage(context, "category")
-        return await q.edit_message_text("Оберіть категорію звернення:", reply_markup=kb_categories())
-
-    if data.startswith("cat:"):
-        cat_key = data.split(":", 1)[1]
-        context.user_data["category"] = cat_key
-        set_stage(context, "await_message")
-        cat_label = _cat_label(cat_key)
+def _fmt_dt(dt: datetime) -> str:
+    # same as dt.strftime("%Y-%m-%d %H:%M") without the strftime round-trip
+    return f"{dt.year:04d}-{dt.month:02d}-{dt.day:02d} {dt.hour:02d}:{dt.minute:02d}"
 
-        return await q.edit_message_text(
-            f"Категорія обрана: *{cat_label}*\n\nНапишіть, будь ласка, ваше повідомлення одним текстом.",
-            parse_mode=ParseMode.MARKDOWN,
-            reply_markup=InlineKeyboardMarkup(
-                [
-                    [InlineKeyboardButton("📂 Змінити категорію", callback_data="menu:categories")],
-                    [InlineKeyboardButton("🏠 Меню", callback_data="menu:home")],
-                ]
-            ),
-        )
 
-    # Fallback
-    return await q.edit_message_text("Оберіть дію:", reply_markup=kb_main_menu())
+def _header_for_message(user: Optional[User], ticket_id: str, cat_label: str, anon: bool, now: datetime) -> str:
+    sender = ""
+    if not anon and user:
+        handle = f" @{user.username}" if user.username else ""
+        sender = f"Від: {user.full_name} (id {user.id}){handle}\n"
+
+    return (
+        "🟦 Нове звернення (ГО «Ф1»)\n"
+        f"ID: {ticket_id}\n"
+        f"Категорія: {cat_label}\n"
+        f"Анонімно: {'Так' if anon else 'Ні'}\n"
+        f"{sender}"
+        f"Час: {_fmt_dt(now)} UTC"
+    )
+
 
+def _utf16_len(text: str) -> int:
+    # Telegram measures message limits in UTF-16 code units
+    return len(text.encode("utf-16-le")) // 2
 
-# -------------------- Message routing --------------------
 
-def _header_for_message(update: Update, ticket_id: str, cat_key: str, anon: bool) -> str:
-    user = update.effective_user
-    cat_label = _cat_label(cat_key)
+def _combined_html(header: str, msg: Message) -> Optional[str]:
+    # Header + user content as one HTML message/caption, or None when it
+    # doesn't fit into a single Telegram message (then header and copy go separately)
+    if msg.text:
+        body, limit = msg.text, MessageLimit.MAX_TEXT_LENGTH
+        body_html = msg.text_html
+    elif msg.photo or msg.video or msg.document or msg.audio or msg.voice or msg.animation:
+        body, limit = msg.caption or "", MessageLimit.CAPTION_LENGTH
+        body_html = msg.caption_html if msg.caption else ""
+    else:
+        return None
 
-    header_lines = [
-        "🟦 Нове звернення (ГО «Ф1»)",
-        f"ID: {ticket_id}",
-        f"Категорія: {cat_label}",
-        f"Анонімно: {'Так' if anon else 'Ні'}",
-    ]
+    if _utf16_len(header) + 2 + _utf16_len(body) > limit:
+        return None
+    return html.escape(header) + ("\n\n" + body_html if body_html else "")
 
-    if not anon and user:
-        line = f"Від: {user.full_name} (id {user.id})"
-        if user.username:
-            line += f" @{user.username}"
-        header_lines.append(line)
 
-    header_lines.append(f"Час: {datetime.utcnow().strftime('%Y-%m-%d %H:%M')} UTC")
-    return "\n".join(header_lines)
+# Per-destination locks: fan-outs for different users run concurrently, but
+# every delivery to a chat holds its lock, so nothing can land between one
+# ticket's header and its copy
+_dest_locks: Dict[int, asyncio.Lock] = {}
+
+
+def _dest_lock(chat_id: int) -> asyncio.Lock:
+    return _dest_locks.setdefault(chat_id, asyncio.Lock())
+
+
+# Sends are retried with exponential backoff only when the request never left
+# the bot (no connection, or no free pool slot); flood control is retried by
+# AIORateLimiter itself. Any other network failure, including a read timeout,
+# may have happened after Telegram accepted the message, so it is logged as
+# "delivery unknown" instead of being resent as a duplicate ticket.
+SEND_BACKOFF_BASE = 0.5
+
+_NOT_SENT_ERRORS = (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout)
+
+
+async def _send_with_retry(send: Callable[[], Awaitable[Any]]) -> Any:
+    for attempt in range(SEND_MAX_RETRIES):
+        try:
+            return await send()
+        except BadRequest:
+            # BadRequest subclasses NetworkError but is never transient
+            raise
+        except NetworkError as e:
+            if not isinstance(e.__cause__, _NOT_SENT_ERRORS):
+                logger.warning("Send outcome unknown, not retrying: %s", e)
+                return None
+            if attempt == SEND_MAX_RETRIES - 1:
+                raise
+            delay = SEND_BACKOFF_BASE * 2 ** attempt
+            logger.info("Send failed before reaching Telegram (%s), retrying in %.1fs", e, delay)
+            await asyncio.sleep(delay)
+
+
+async def _forward_to(
+    context: ContextTypes.DEFAULT_TYPE,
+    kind: str,
+    chat_id: int,
+    header: str,
+    msg: Message,
+    combined: Optional[str],
+) -> bool:
+    try:
+        async with _dest_lock(chat_id):
+            if combined is None:
+                await _send_with_retry(lambda: context.bot.send_message(chat_id=chat_id, text=header))
+                await _send_with_retry(lambda: msg.copy(chat_id=chat_id))
+            elif msg.text:
+                await _send_with_retry(
+                    lambda: context.bot.send_message(chat_id=chat_id, text=combined, parse_mode=ParseMode.HTML)
+                )
+            else:
+                await _send_with_retry(lambda: msg.copy(chat_id=chat_id, caption=combined, parse_mode=ParseMode.HTML))
+    except Forbidden as e:
+        # bot was blocked or removed: retrying won't help until staff/groups config changes
+        logger.warning("Cannot forward to %s %s (forbidden): %s", kind, chat_id, e)
+        return False
+    except RetryAfter as e:
+        # AIORateLimiter already retried SEND_MAX_RETRIES times
+        logger.error("Gave up forwarding to %s %s: flood control, retry after %ss", kind, chat_id, e.retry_after)
+        return False
+    except Exception as e:
+        logger.warning("Failed to forward to %s %s: %s", kind, chat_id, e)
+        return False
+    return True
+
+
+async def _deliver_ticket(context: ContextTypes.DEFAULT_TYPE, header: str, msg: Message) -> None:
+    # send to groups and staff concurrently; one message per chat when the
+    # header fits next to the content, otherwise header + copy in order
+    combined = _combined_html(header, msg)
+    results = await asyncio.gather(
+        *(_forward_to(context, "group", chat_id, header, msg, combined) for chat_id in active_group_ids()),
+        *(_forward_to(context, "staff", user_id, header, msg, combined) for user_id in active_staff_ids()),
+    )
+    if not any(results):
+        logger.error("Ticket from chat %s was not delivered to any recipient", msg.chat_id)
+
+
+# -------------------- Delivery workers --------------------
+
+# One worker per source chat: a user's tickets are delivered in order, while
+# fan-outs of different users don't wait for each other. Idle workers exit.
+WORKER_IDLE_TIMEOUT = 10.0
+
+_chat_queues: Dict[int, asyncio.Queue] = {}
+
+
+async def _chat_worker(chat_id: int, queue: asyncio.Queue) -> None:
+    # long-lived: don't keep the snapshot of the update that spawned the worker
+    _update_snapshot.set(None)
+    while True:
+        try:
+            context, header, msg = await asyncio.wait_for(queue.get(), timeout=WORKER_IDLE_TIMEOUT)
+        except asyncio.TimeoutError:
+            if queue.empty():
+                _chat_queues.pop(chat_id, None)
+                return
+            continue
+        try:
+            await _deliver_ticket(context, header, msg)
+        except Exception as e:
+            logger.exception("Ticket delivery failed for chat %s: %s", chat_id, e)
+
+
+def enqueue_delivery(context: ContextTypes.DEFAULT_TYPE, chat_id: int, header: str, msg: Message) -> None:
+    queue = _chat_queues.get(chat_id)
+    if queue is None:
+        queue = _chat_queues[chat_id] = asyncio.Queue()
+        context.application.create_task(_chat_worker(chat_id, queue))
+    queue.put_nowait((context, header, msg))
+
 
+# -------------------- Incoming messages --------------------
 
+@per_update_snapshot
 async def route_incoming(update: Update, context: ContextTypes.DEFAULT_TYPE):
     msg = update.message
     if not msg:
         return
+    user = update.effective_user
 
     # If user hasn't started flow, show menu to reduce friction
-    stage = get_stage(context)
-    if stage == "menu" and msg.text and msg.text.strip() not in ("/start", "/menu"):
+    flow = get_flow(context)
+    if flow.stage == Stage.MENU and msg.text and msg.text.strip() not in ("/start", "/menu"):
         # Show menu and don't lose the user's text - but also accept it if we already have category
-        await msg.reply_text("Оберіть дію в меню нижче:", reply_markup=kb_main_menu())
+        await msg.reply_text("Оберіть дію в меню нижче:", reply_markup=KB_MAIN_MENU)
         return
 
     # Require category selection before accepting a free-form message
-    cat_key = context.user_data.get("category")
-    anon = bool(context.user_data.get("anon", False))
+    cat_key = flow.category
+    anon = bool(flow.anon)
 
-    if get_stage(context) != "await_message" or not cat_key:
-        await msg.reply_text("Щоб залишити звернення, натисніть «Почати» і оберіть категорію.", reply_markup=kb_main_menu())
+    if flow.stage != Stage.AWAIT_MESSAGE or not cat_key:
+        await msg.reply_text("Щоб залишити звернення, натисніть «Почати» і оберіть категорію.", reply_markup=KB_MAIN_MENU)
         reset_user_flow(context)
         return
 
-    ticket_id = next_ticket_id()
-    header = _header_for_message(update, ticket_id, str(cat_key), anon)
+    # Nowhere to deliver: don't burn a ticket id or log anything, keep the flow
+    if not active_group_ids() and not active_staff_ids():
+        logger.warning("No active groups or staff configured; message from chat %s not routed", msg.chat_id)
+        await msg.reply_text("На жаль, зараз звернення не можуть бути прийняті. Спробуйте, будь ласка, пізніше.")
+        return
 
-    # send to groups
-    groups = load_groups()
-    for g in groups:
-        try:
-            await context.bot.send_message(chat_id=g.chat_id, text=header)
-            await msg.copy(chat_id=g.chat_id)
-        except Exception as e:
-            logger.warning("Failed to forward to group %s: %s", g.chat_id, e)
+    # reset to menu before any await so a concurrent update can't reuse the flow
+    reset_user_flow(context)
 
-    # send to staff
-    staff = load_staff()
-    for s in staff:
-        try:
-            await context.bot.send_message(chat_id=s.user_id, text=header)
-            await msg.copy(chat_id=s.user_id)
-        except Exception as e:
-            logger.warning("Failed to forward to staff %s: %s", s.user_id, e)
+    # one clock read per ticket, shared by the id, header, working-time check and log row
+    now = datetime.now(timezone.utc)
+    ticket_id = next_ticket_id(now)
+    cat_label = _cat_label(str(cat_key))
+    header = _header_for_message(user, ticket_id, cat_label, anon, now)
+
+    # fan-out runs in this chat's delivery worker; the user gets the reply right away
+    enqueue_delivery(context, msg.chat_id, header, msg)
 
     # log to sheets
     cfg = load_config()
-    working = is_working_time(cfg)
-    user = update.effective_user
+    working = is_working_time(cfg, now)
     row = [
-        datetime.utcnow().isoformat(timespec="seconds") + "Z",
+        now.replace(tzinfo=None).isoformat(timespec="seconds") + "Z",
         ticket_id,
-        _cat_label(str(cat_key)),
+        cat_label,
         "Так" if anon else "Ні",
         "" if anon else (user.full_name if user else ""),
         "" if anon else (f"@{user.username}" if user and user.username else ""),
@@ -543,10 +1313,7 @@ async def route_incoming(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     # user reply
     reply_text = get_user_reply_text(cfg, working)
-    await msg.reply_text(reply_text, reply_markup=kb_main_menu())
-
-    # reset to menu for next time
-    reset_user_flow(context)
+    await msg.reply_text(reply_text, reply_markup=KB_MAIN_MENU)
 
 
 # -------------------- Error handler --------------------
@@ -555,13 +1322,45 @@ async def on_error(update: object, context: ContextTypes.DEFAULT_TYPE) -> None:
     logger.exception("Unhandled error", exc_info=context.error)
 
 
+async def on_startup(app: Application) -> None:
+    start_sheets_worker()
+    start_user_data_sweeper(app)
+
+
+async def on_shutdown(app: Application) -> None:
+    stop_user_data_sweeper()
+    # let an in-flight write finish: cancelling wouldn't stop its worker thread
+    if _runtime_flush_task is not None and not _runtime_flush_task.done():
+        await _runtime_flush_task
+    await flush_runtime_data()
+    await stop_sheets_worker()
+
+
 # -------------------- Main --------------------
 
 def main():
     if not BOT_TOKEN:
         raise SystemExit("❌ Не задан TELEGRAM_BOT_TOKEN")
 
-    app = Application.builder().token(BOT_TOKEN).build()
+    # optional faster event loop; PTB creates its loop through the installed policy
+    try:
+        import uvloop  # type: ignore
+    except ImportError:
+        pass
+    else:
+        uvloop.install()
+
+    app = (
+        Application.builder()
+        .token(BOT_TOKEN)
+        .concurrent_updates(CONCURRENT_UPDATES)
+        # stays under Telegram's ~30 msg/s bot-wide and 20 msg/min per-group limits;
+        # RetryAfter (429) responses are waited out and retried
+        .rate_limiter(AIORateLimiter(overall_max_rate=SEND_RATE, max_retries=SEND_MAX_RETRIES))
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
 
     app.add_handler(CommandHandler("start", cmd_start))
     app.add_handler(CommandHandler("menu", cmd_menu))
@@ -570,12 +1369,26 @@ def main():
 
     app.add_handler(CallbackQueryHandler(on_callback))
 
-    app.add_handler(MessageHandler(filters.ALL & ~filters.COMMAND, route_incoming))
+    # tickets come only from private chats; messages in staff groups are ignored
+    app.add_handler(MessageHandler(filters.ChatType.PRIVATE & ~filters.COMMAND, route_incoming))
 
     app.add_error_handler(on_error)
 
-    # Polling is OK for Railway/Render as long as only one instance runs
-    app.run_polling(allowed_updates=Update.ALL_TYPES)
+    if WEBHOOK_URL:
+        # Telegram pushes updates to https://<WEBHOOK_URL>/<token>; no getUpdates loop
+        app.run_webhook(
+            listen="0.0.0.0",
+            port=WEBHOOK_PORT,
+            url_path=BOT_TOKEN,
+            webhook_url=f"{WEBHOOK_URL.rstrip('/')}/{BOT_TOKEN}",
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=Update.ALL_TYPES,
+        )
+        return
+
+    # Polling is OK for Railway/Render as long as only one instance runs.
+    # Long polling: getUpdates waits up to POLL_TIMEOUT seconds for new updates.
+    app.run_polling(allowed_updates=Update.ALL_TYPES, timeout=POLL_TIMEOUT, poll_interval=0.0)
 
 
 if __name__ == "__main__":
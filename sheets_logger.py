@@ -5,8 +5,11 @@ import os
 import json
 from typing import Dict, Any, List, Optional
 
+import httplib2
+from google.auth.exceptions import TransportError
 from google.oauth2.service_account import Credentials
 from googleapiclient.discovery import build
+from googleapiclient.errors import HttpError
 
 
 class SheetsLogger:
@@ -22,6 +25,23 @@ class SheetsLogger:
     - env F1_GOOGLE_SA_JSON (full JSON content)
     - env F1_GOOGLE_SA_FILE (path to JSON file in runtime)
     """
+    # Column order of log_event rows (stable)
+    _COLS = (
+        "event",
+        "timestamp",
+        "case_id",
+        "anonymous",
+        "category_key",
+        "category_label",
+        "message_type",
+        "text",
+        "user_id",
+        "username",
+        "full_name",
+        "status",
+        "actor",
+    )
+
     def __init__(self, spreadsheet_id: str, tab_name: str, sa_json: str = "", sa_file: str = ""):
         self.spreadsheet_id = spreadsheet_id
         self.tab_name = tab_name or "log"
@@ -29,6 +49,11 @@ class SheetsLogger:
         self.sa_file = sa_file
         self._service = None
 
+    @property
+    def configured(self) -> bool:
+        # a sheet and some credentials are set (they may still be invalid)
+        return bool(self.spreadsheet_id and (self.sa_json or self.sa_file))
+
     def _get_service(self):
         if self._service is not None:
             return self._service
@@ -57,42 +82,76 @@ class SheetsLogger:
         self._service = build("sheets", "v4", credentials=creds, cache_discovery=False)
         return self._service
 
+    def append_rows(self, rows: List[List[Any]]) -> None:
+        """
+        Append several rows with a single API request. Raises on API errors.
+        """
+        service = self._get_service()
+        if service is None or not rows:
+            return
+
+        body = {"values": rows}
+        rng = f"{self.tab_name}!A1"
+        service.spreadsheets().values().append(
+            spreadsheetId=self.spreadsheet_id,
+            range=rng,
+            valueInputOption="RAW",
+            insertDataOption="INSERT_ROWS",
+            body=body,
+        ).execute()
+
     def log_event(self, event: Dict[str, Any]) -> None:
         """
         Append one row. This method must never crash the bot.
         """
         try:
-            service = self._get_service()
-            if service is None:
-                return
-
-            # Define column order (stable)
-            cols = [
-                "event",
-                "timestamp",
-                "case_id",
-                "anonymous",
-                "category_key",
-                "category_label",
-                "message_type",
-                "text",
-                "user_id",
-                "username",
-                "full_name",
-                "status",
-                "actor",
-            ]
-            row = [str(event.get(k, "")) for k in cols]
-
-            body = {"values": [row]}
-            rng = f"{self.tab_name}!A1"
-            service.spreadsheets().values().append(
-                spreadsheetId=self.spreadsheet_id,
-                range=rng,
-                valueInputOption="RAW",
-                insertDataOption="INSERT_ROWS",
-                body=body,
-            ).execute()
+            row = [str(event.get(k, "")) for k in self._COLS]
+            self.append_rows([row])
         except Exception:
             # intentionally swallow errors to avoid bot downtime
             return
+
+
+_default_logger: Optional[SheetsLogger] = None
+
+
+def _get_default_logger() -> SheetsLogger:
+    # Configured from env: F1_SHEETS_ID, F1_SHEETS_TAB, F1_GOOGLE_SA_JSON / F1_GOOGLE_SA_FILE
+    global _default_logger
+    if _default_logger is None:
+        _default_logger = SheetsLogger(
+            spreadsheet_id=os.environ.get("F1_SHEETS_ID", ""),
+            tab_name=os.environ.get("F1_SHEETS_TAB", ""),
+            sa_json=os.environ.get("F1_GOOGLE_SA_JSON", ""),
+            sa_file=os.environ.get("F1_GOOGLE_SA_FILE", ""),
+        )
+    return _default_logger
+
+
+def is_configured() -> bool:
+    """
+    True when the env-configured logger has a sheet id and credentials.
+    """
+    return _get_default_logger().configured
+
+
+def append_rows(rows: List[List[Any]]) -> None:
+    """
+    Append raw rows to the env-configured sheet in one request (no-op if not configured).
+    """
+    _get_default_logger().append_rows([[str(v) for v in row] for row in rows])
+
+
+def append_row(row: List[Any]) -> None:
+    append_rows([row])
+
+
+def is_transient_error(exc: BaseException) -> bool:
+    """
+    True for append failures worth retrying: rate limits, server errors and
+    network trouble. Auth, permission and bad-range errors are permanent.
+    """
+    if isinstance(exc, HttpError):
+        status = exc.resp.status
+        return status == 429 or status >= 500
+    return isinstance(exc, (TransportError, httplib2.HttpLib2Error, OSError))